@@ -1,30 +1,138 @@
 import streamlit as st
 import networkx as nx
 import plotly.graph_objects as go
-import json
+import igraph
+import numpy as np
+import orjson
 import re
 import os
 
+try:
+    import ahocorasick
+except ImportError:  # keyword matching falls back to a plain byte search
+    ahocorasick = None
+
 # --- Streamlit page setup ---
 st.set_page_config(page_title="NASA Publications 3D Knowledge Graph", layout="wide")
 st.title("s")
 
+# Common space biology keywords
+keywords = {
+    'microgravity': 'Microgravity',
+    'bone': 'Bone',
+    'muscle': 'Muscle',
+    'cardiovascular': 'Cardiovascular',
+    'radiation': 'Radiation',
+    'oxidative stress': 'Oxidative Stress',
+    'cell cycle': 'Cell Cycle',
+    'stem cell': 'Stem Cells',
+    'osteoblast': 'Osteoblasts',
+    'spaceflight': 'Spaceflight',
+    'immune': 'Immune System',
+    'gene expression': 'Gene Expression'
+}
+
+# Build a single Aho-Corasick automaton so each document is scanned once for all keywords
+KW_AC = None
+if ahocorasick is not None:
+    KW_AC = ahocorasick.Automaton()
+    for keyword_search, keyword_label in keywords.items():
+        KW_AC.add_word(keyword_search, keyword_label)
+    KW_AC.make_automaton()
+
+# Pre-encoded patterns for the fallback, searched with bytes.find
+KW_PAIRS = [(keyword_search.encode(), keyword_label) for keyword_search, keyword_label in keywords.items()]
+
+# Mission and organism patterns, compiled once rather than per document
+MISSION_RE = re.compile(r'\b(Bion-M\s?\d+|STS-\d+|ISS|International Space Station|Space Shuttle|Spacelab-?\d*|NeuroLab)\b', re.IGNORECASE)
+# Organism text is lowercased once per document, so this pattern is matched case-sensitively.
+# Each group is named after its canonical label, so `match.lastgroup` is the organism node.
+ORGANISM_RE = re.compile(r'\b(?:(?P<Mice>mice|mouse|mus musculus|c57bl/6j?)|(?P<Rats>rats)|(?P<Humans>human|homo sapiens))\b')
+# Plain substrings that every ORGANISM_RE match contains; the regex only runs if one is present
+ORG_TOKENS = ('mice', 'mouse', 'mus musculus', 'rats', 'human', 'homo sapiens', 'c57bl')
+
+DATA_PATH = 'cleaned.json'
+SNAPSHOT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'nasa_kg', 'graph.json')
+# Bump whenever the graph-building logic changes so older snapshots are rebuilt
+SNAPSHOT_VERSION = 1
+
 # --- Data Loading and Caching ---
-@st.cache_data
-def load_graph_data():
-    """Loads data from JSON and builds the full knowledge graph."""
+def read_snapshot(file_mtime):
+    """Returns the graph arrays saved for `file_mtime`, or None if there is no usable snapshot."""
+    try:
+        with open(SNAPSHOT_PATH, 'rb') as f:
+            snapshot = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    if not isinstance(snapshot, dict):
+        return None
+    if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('file_mtime') != file_mtime:
+        return None
+    # A readable file of the wrong shape is treated like a missing one and rebuilt
+    try:
+        graph_data = snapshot['graph']
+        if not isinstance(graph_data, dict) or not graph_data.keys() >= {'names', 'types', 'colors', 'sizes', 'labels', 'edges'}:
+            return None
+        graph_data['sizes'] = np.array(graph_data['sizes'], dtype=np.int16)
+        graph_data['edges'] = np.array(graph_data['edges'], dtype=np.int32).reshape(-1, 2)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return graph_data
+
+def write_snapshot(file_mtime, graph_data):
+    """Saves the graph arrays as JSON, tagged with the mtime of the file they were built from."""
+    snapshot = {'version': SNAPSHOT_VERSION, 'file_mtime': file_mtime, 'graph': graph_data}
+    blob = orjson.dumps(snapshot, option=orjson.OPT_SERIALIZE_NUMPY)
+    tmp_path = SNAPSHOT_PATH + '.tmp'
     try:
-        with open('cleaned.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        os.makedirs(os.path.dirname(SNAPSHOT_PATH), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp_path, SNAPSHOT_PATH)
+    except OSError:
+        # The snapshot only speeds up cold starts; the app works without it
+        pass
+
+@st.cache_data(show_spinner=False)
+def load_graph_data(file_mtime):
+    """Loads data from JSON and builds the full knowledge graph as parallel node arrays.
+
+    Nodes are integer ids indexing the `names`, `types`, `colors`, `sizes` and
+    `labels` arrays; `edges` is an (E, 2) array of node ids. A snapshot built
+    from the same `file_mtime` is reused instead of re-parsing the source file.
+    """
+    if file_mtime is not None:
+        graph_data = read_snapshot(file_mtime)
+        if graph_data is not None:
+            return graph_data
+
+    try:
+        with open(DATA_PATH, 'rb') as f:
+            data = orjson.loads(f.read())
     except FileNotFoundError:
-        st.error("Error: `sb_publication_output.json` not found.")
-        return nx.Graph()
+        st.error(f"Error: `{DATA_PATH}` not found.")
+        data = {}
     
-    G = nx.Graph()
+    # Node attributes are kept column-wise; `name_to_idx` dedupes repeated
+    # missions/keywords/organisms and hands out ids in insertion order.
+    name_to_idx = {}
+    names, types, colors, sizes, labels = [], [], [], [], []
+    edges = []
     type_colors = {
         'Publication': '#ff6f61', 'Mission': '#9e9ac8', 'Keyword': '#74c476',
         'Organism': '#6baed6', 'Location': '#fdae6b'
     }
+
+    def node_id(name, node_type, size, label):
+        idx = name_to_idx.get(name)
+        if idx is None:
+            idx = name_to_idx[name] = len(names)
+            names.append(name)
+            types.append(node_type)
+            colors.append(type_colors[node_type])
+            sizes.append(size)
+            labels.append(label)
+        return idx
     
     # Parse each document in the JSON
     for doc_id, doc in data.items():
@@ -36,66 +144,71 @@ def load_graph_data():
             continue
         
         # Add publication node
-        pub_id = f"pub_{doc_id}"
-        G.add_node(pub_id, type='Publication', color=type_colors['Publication'], 
-                   size=18, label=title[:100])
+        pub_idx = node_id(f"pub_{doc_id}", 'Publication', 18, title[:100])
         
         # Extract missions from Introduction text (e.g., "Bion-M 1", "STS-131", "ISS")
         intro = doc.get('Introduction', '') or ''
         if intro:
-            mission_pattern = re.compile(r'\b(Bion-M\s?\d+|STS-\d+|ISS|International Space Station|Space Shuttle|Spacelab-?\d*|NeuroLab)\b', re.IGNORECASE)
-            missions = set(mission_pattern.findall(intro))
+            # The pattern starts and ends on \b, so matches never carry surrounding whitespace
+            missions = {match.group(0) for match in MISSION_RE.finditer(intro)}
             for mission in missions:
-                mission_clean = mission.strip()
-                G.add_node(mission_clean, type='Mission', color=type_colors['Mission'], 
-                          size=14, label=mission_clean)
-                G.add_edge(pub_id, mission_clean)
+                edges.append((pub_idx, node_id(mission, 'Mission', 14, mission)))
         
         # Extract keywords from title and abstract
         abstract = doc.get('Abstract', '') or ''
         combined_text = f"{title} {abstract}".lower()
         
-        # Common space biology keywords
-        keywords = {
-            'microgravity': 'Microgravity',
-            'bone': 'Bone',
-            'muscle': 'Muscle',
-            'cardiovascular': 'Cardiovascular',
-            'radiation': 'Radiation',
-            'oxidative stress': 'Oxidative Stress',
-            'cell cycle': 'Cell Cycle',
-            'stem cell': 'Stem Cells',
-            'osteoblast': 'Osteoblasts',
-            'spaceflight': 'Spaceflight',
-            'immune': 'Immune System',
-            'gene expression': 'Gene Expression'
-        }
-        
-        for keyword_search, keyword_label in keywords.items():
-            if keyword_search in combined_text:
-                G.add_node(keyword_label, type='Keyword', color=type_colors['Keyword'], 
-                          size=10, label=keyword_label)
-                G.add_edge(pub_id, keyword_label)
+        # Collect each matched keyword once per document
+        if KW_AC is not None:
+            doc_keywords = dict.fromkeys(label for _, label in KW_AC.iter(combined_text))
+        else:
+            buf = combined_text.encode('utf-8', 'ignore')
+            doc_keywords = [label for kb, label in KW_PAIRS if buf.find(kb) != -1]
+        for keyword_label in doc_keywords:
+            edges.append((pub_idx, node_id(keyword_label, 'Keyword', 10, keyword_label)))
         
         # Extract organisms (mice, rats, humans)
-        organism_pattern = re.compile(r'\b(mice|mouse|Mus musculus|rats|human|Homo sapiens|C57BL/6J?)\b', re.IGNORECASE)
-        organisms = set(organism_pattern.findall(intro + ' ' + abstract))
-        organism_mapping = {
-            'mice': 'Mice', 'mouse': 'Mice', 'mus musculus': 'Mice',
-            'rats': 'Rats', 'human': 'Humans', 'homo sapiens': 'Humans',
-            'c57bl/6j': 'Mice', 'c57bl/6': 'Mice'
-        }
-        
-        for org in organisms:
-            org_label = organism_mapping.get(org.lower(), org.title())
-            G.add_node(org_label, type='Organism', color=type_colors['Organism'], 
-                      size=12, label=org_label)
-            G.add_edge(pub_id, org_label)
+        organism_text = f"{intro} {abstract}".lower()
+        org_labels = {}
+        if any(token in organism_text for token in ORG_TOKENS):
+            # Several spellings map to the same organism, so dedupe on the label
+            org_labels = dict.fromkeys(match.lastgroup for match in ORGANISM_RE.finditer(organism_text))
+        for org_label in org_labels:
+            edges.append((pub_idx, node_id(org_label, 'Organism', 12, org_label)))
     
-    return G
+    graph_data = dict(
+        names=names, types=types, colors=colors, sizes=np.array(sizes, dtype=np.int16),
+        labels=labels, edges=np.array(edges, dtype=np.int32).reshape(-1, 2)
+    )
+    if file_mtime is not None:
+        write_snapshot(file_mtime, graph_data)
+    return graph_data
+
+@st.cache_resource(show_spinner=False)
+def get_graph(file_mtime):
+    """Loads the cached graph arrays and builds a NetworkX graph over the node ids."""
+    graph_data = load_graph_data(file_mtime)
+    G = nx.Graph()
+    G.add_nodes_from(range(len(graph_data['names'])))
+    G.add_edges_from(graph_data['edges'].tolist())
+    return graph_data, G
+
+@st.cache_data(show_spinner=False)
+def summarize_graph(_graph_data, graph_key):
+    """Groups the node ids by type in a single pass.
+
+    `_graph_data` is not hashed; `graph_key` identifies which cached graph it is.
+    """
+    nodes_by_type = {}
+    for idx, node_type in enumerate(_graph_data['types']):
+        nodes_by_type.setdefault(node_type, []).append(idx)
+    return nodes_by_type, sorted(nodes_by_type), len(nodes_by_type.get('Publication', []))
 
 # Load the full graph
-full_G = load_graph_data()
+data_mtime = os.path.getmtime(DATA_PATH) if os.path.exists(DATA_PATH) else None
+graph_data, full_G = get_graph(data_mtime)
+nodes_by_type, all_node_types, total_publications = summarize_graph(graph_data, data_mtime)
+pub_nodes_all = nodes_by_type.get('Publication', [])
 
 # Display graph statistics
 st.sidebar.header("Graph Statistics")
@@ -105,7 +218,6 @@ st.sidebar.write(f"Total Edges: {full_G.number_of_edges()}")
 # --- Streamlit Sidebar Controls ---
 st.sidebar.header("Graph Controls")
 # Dynamically set slider bounds based on number of publication nodes in the full graph
-total_publications = len([n for n, d in full_G.nodes(data=True) if d.get('type') == 'Publication'])
 # Provide sensible fallbacks
 slider_min = 1 if total_publications >= 1 else 0
 slider_max = total_publications if total_publications >= 1 else 1
@@ -113,7 +225,6 @@ slider_max = total_publications if total_publications >= 1 else 1
 default_val = 50 if total_publications >= 50 else slider_max
 max_pubs = st.sidebar.slider("Max Publications to Display", slider_min, slider_max, default_val)
 
-all_node_types = sorted(list(set(nx.get_node_attributes(full_G, 'type').values())))
 desired_defaults = ['Publication', 'Mission', 'Keyword', 'Organism']
 actual_defaults = [t for t in desired_defaults if t in all_node_types]
 
@@ -123,78 +234,76 @@ selected_types = st.sidebar.multiselect(
     default=actual_defaults
 )
 
-# 1. Get all publication nodes (no slice) so the subgraph includes every publication
-pub_nodes_all = [n for n, d in full_G.nodes(data=True) if d.get('type') == 'Publication']
-
-# 2. Create a subgraph containing all publications and their direct neighbors
-nodes_to_consider = set(pub_nodes_all)
-for pub_node in pub_nodes_all:
-    nodes_to_consider.update(full_G.neighbors(pub_node))
-sub_G = full_G.subgraph(nodes_to_consider)
-
-# 3. From this subgraph, select only the nodes whose type is in the multiselect widget
-# But when publications are selected, limit which publication nodes are shown to the
-# first `max_pubs` (to preserve the slider behavior while still building on full data).
-pubs_in_sub = [n for n, d in sub_G.nodes(data=True) if d.get('type') == 'Publication']
-pubs_to_show = set(pubs_in_sub[:max_pubs]) if 'Publication' in selected_types else set()
-
-final_nodes_to_keep = []
-for n, d in sub_G.nodes(data=True):
-    node_type = d.get('type')
-    if node_type not in selected_types:
-        continue
-    if node_type == 'Publication':
-        # Only include publication nodes that fall within the slider limit
-        if n in pubs_to_show:
-            final_nodes_to_keep.append(n)
-    else:
-        # include non-publication nodes if their type is selected
-        final_nodes_to_keep.append(n)
-
-final_G = sub_G.subgraph(final_nodes_to_keep)
+# Every non-publication node is created together with an edge to a publication, so
+# all of them neighbour some publication. Select straight from the per-type node lists
+# instead of materializing a subgraph of all publications and their neighbours.
+# Publications are limited to the first `max_pubs` (the slider); non-publication
+# nodes are included whenever their type is selected.
+final_nodes_to_keep = list(pub_nodes_all[:max_pubs]) if 'Publication' in selected_types else []
+for node_type in selected_types:
+    if node_type != 'Publication':
+        final_nodes_to_keep.extend(nodes_by_type.get(node_type, []))
+
+final_G = full_G.subgraph(final_nodes_to_keep)
 
 
 # --- Generate 3D Layout ---
-if len(final_G.nodes()) > 0:
-    pos = nx.spring_layout(final_G, dim=3, seed=42, iterations=50)
-
-    # --- Create Plotly Traces ---
-    edge_x, edge_y, edge_z = [], [], []
-    edge_labels=[]
-    for edge in final_G.edges():
-        x0, y0, z0 = pos[edge[0]]
-        x1, y1, z1 = pos[edge[1]]
-        edge_x.extend([x0, x1, None])
-        edge_y.extend([y0, y1, None])
-        edge_z.extend([z0, z1, None])
-    
-        # Get node types for meaningful hover text
-        src_type = final_G.nodes[edge[0]].get('type', 'Unknown')
-        dst_type = final_G.nodes[edge[1]].get('type', 'Unknown')
-        edge_labels.append(f"{edge[0]} → {edge[1]}<br>({src_type} → {dst_type})")
+# Per-selection caches keep only the most recent selections so memory stays bounded
+SELECTION_CACHE_ENTRIES = 32
+
+@st.cache_data(show_spinner="Computing layout...", max_entries=SELECTION_CACHE_ENTRIES)
+def compute_layout(nodes_tuple, edges_tuple):
+    """Computes a 3D Fruchterman-Reingold layout and node degrees with igraph.
 
-    edge_trace = go.Scatter3d(
-        x=edge_x, y=edge_y, z=edge_z,
+    Returns an (N, 3) coordinate array and the degree of each node, both in
+    the order of `nodes_tuple`. Cached on the node and edge sets, so reruns
+    that land on the same selection skip the layout entirely.
+    """
+    node_to_idx = {n: i for i, n in enumerate(nodes_tuple)}
+    ig_G = igraph.Graph(n=len(nodes_tuple), edges=[(node_to_idx[u], node_to_idx[v]) for u, v in edges_tuple])
+    # Start from a fixed random layout so the same selection always gets the same result,
+    # without touching igraph's process-wide RNG
+    seed = np.random.default_rng(42).uniform(-1, 1, (len(nodes_tuple), 3)).tolist()
+    layout = ig_G.layout_fruchterman_reingold_3d(niter=50, seed=seed)
+    return np.asarray(layout.coords), ig_G.degree()
+
+# --- Create Plotly Traces ---
+@st.cache_data(show_spinner=False, max_entries=SELECTION_CACHE_ENTRIES)
+def build_traces(_graph_data, graph_key, nodes_tuple, edges_tuple):
+    """Builds the edge and node trace arguments for the selected nodes and edges.
+
+    Returns two plain dicts to be passed to `go.Scatter3d`. `_graph_data` is
+    not hashed; `graph_key` identifies which cached graph it is.
+    """
+    coords, node_degrees = compute_layout(nodes_tuple, edges_tuple)
+    kept = np.array(nodes_tuple, dtype=np.intp)
+    edge_ids = np.array(edges_tuple, dtype=np.intp).reshape(-1, 2)
+
+    # Each edge becomes three rows (source, target, NaN gap) gathered from `coords`.
+    # `kept` is sorted, so a node id's row in `coords` is found by binary search.
+    edge_rows = np.searchsorted(kept, edge_ids)
+    edge_xyz = np.empty((3 * len(edge_ids), 3))
+    edge_xyz[0::3] = coords[edge_rows[:, 0]]
+    edge_xyz[1::3] = coords[edge_rows[:, 1]]
+    edge_xyz[2::3] = np.nan
+
+    # Node names and types for meaningful hover text
+    names, types, labels = _graph_data['names'], _graph_data['types'], _graph_data['labels']
+    edge_labels = [f"{names[u]} → {names[v]}<br>({types[u]} → {types[v]})" for u, v in edges_tuple]
+
+    edge_trace = dict(
+        x=edge_xyz[:, 0], y=edge_xyz[:, 1], z=edge_xyz[:, 2],
         line=dict(width=1, color='#999'),
         text=edge_labels * 2,
         hoverinfo='text',
         mode='lines'
     )
 
-    node_x, node_y, node_z = [], [], []
-    node_colors, node_sizes, node_labels = [], [], []
-    node_degrees = []
-    for node, attrs in final_G.nodes(data=True):
-        x, y, z = pos[node]
-        node_x.append(x)
-        node_y.append(y)
-        node_z.append(z)
-        node_colors.append(attrs.get('color', '#cccccc'))
-        node_sizes.append(attrs.get('size', 10))
-        node_labels.append(f"{attrs.get('type', 'N/A')}:<br>{attrs.get('label', 'N/A')}")
-        node_degrees.append(final_G.degree(node))
-
-    node_trace = go.Scatter3d(
+    node_x, node_y, node_z = coords.T
+    node_sizes = _graph_data['sizes'][kept]
+    node_labels = [f"{types[i]}:<br>{labels[i]}" for i in nodes_tuple]
+
+    node_trace = dict(
         x=node_x, y=node_y, z=node_z,
         mode='markers',
         hoverinfo='text',
@@ -212,9 +321,16 @@ if len(final_G.nodes()) > 0:
             line_width=1
         )
     )
+    return edge_trace, node_trace
+
+if len(final_G.nodes()) > 0:
+    # Sort nodes and edge endpoints so the cache keys don't depend on iteration order
+    layout_nodes = tuple(sorted(final_G.nodes()))
+    layout_edges = tuple(sorted(tuple(sorted(edge)) for edge in final_G.edges()))
+    edge_trace, node_trace = build_traces(graph_data, data_mtime, layout_nodes, layout_edges)
 
     # --- Combine traces and create figure ---
-    fig = go.Figure(data=[edge_trace, node_trace],
+    fig = go.Figure(data=[go.Scatter3d(**edge_trace), go.Scatter3d(**node_trace)],
         layout=go.Layout(
             title='3D Knowledge Graph of NASA Publications',
             showlegend=False,